@@ -1 +1,7 @@
-from . import agent
+# agent modülü (Firebase/Gemini client'ları) import anında kurulur; paket import'unda
+# yüklenmesin diye tembel: CV ayrıştırma süreçleri sadece my_agent.cv_parser'ı import eder.
+def __getattr__(name):
+    if name == "agent":
+        from . import agent
+        return agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,21 +1,30 @@
 import os
-import uvicorn
-import json
-import io
+import orjson
 import time
-import requests  # YENİ: Firebase REST API çağrıları için
-from datetime import datetime
-from typing import List, Optional
+import asyncio
+import httpx  # Firebase REST API çağrıları için (async)
+import anyio.to_thread
+from datetime import datetime, timezone
+from typing import List, Optional, Union
 import traceback
-
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body, Depends
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import base64
+import random
+import re
+from collections import OrderedDict, defaultdict
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from pydantic.alias_generators import to_camel
 from dotenv import load_dotenv
 
 # --- FIREBASE IMPORTLARI ---
 import firebase_admin
-from firebase_admin import credentials, firestore, storage, auth  # auth EKLENDİ
+from firebase_admin import credentials, firestore, firestore_async, storage, auth  # auth EKLENDİ
 
 # --- AYARLAR VE PATH ---
 base_path = os.path.dirname(os.path.abspath(__file__))
@@ -26,24 +35,44 @@ load_dotenv()
 # DİKKAT: Backend'in şifre doğrulaması yapabilmesi için Web API Key gereklidir.
 FIREBASE_WEB_API_KEY = os.getenv("FIREBASE_WEB_API_KEY")
 
+# HTTP/2 için httpx'in 'h2' ekstrası gerekir; yoksa HTTP/1.1 keep-alive ile devam edilir
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+    print("⚠️ h2 bulunamadı - HTTP/1.1 kullanılacak (pip install 'httpx[http2]')")
+
+# Firebase REST çağrıları için paylaşılan client: TLS bağlantısı istekler arasında korunur
+LOGIN_CLIENT = httpx.AsyncClient(
+    http2=HTTP2_AVAILABLE,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=20)
+)
+
+# Gemini (client.aio) için paylaşılan HTTP/2 (varsa) havuzu: paralel analizler aynı bağlantıları kullanır
+GEMINI_HTTP_CLIENT = httpx.AsyncClient(
+    http2=HTTP2_AVAILABLE,
+    timeout=60.0,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+)
+
 # --- GOOGLE GENAI (AI) IMPORT ---
 try:
-    from google.genai import Client
+    from google.genai import Client, types
 
     ADK_AVAILABLE = True
 except ImportError:
     ADK_AVAILABLE = False
     print("⚠️ Google GenAI bulunamadı - Mock mode aktif")
 
-# --- PDF/DOCX IMPORT ---
-try:
-    from pypdf import PdfReader
-except ImportError:
-    PdfReader = None
+# --- CV AYRIŞTIRMA ---
+# Ayrıştırma process havuzunda çalışır; spawn edilen süreçler sadece bu yan etkisiz modülü import eder
 try:
-    from docx import Document
+    from .cv_parser import CVRejectedError, parse_bytes
 except ImportError:
-    Document = None
+    from cv_parser import CVRejectedError, parse_bytes
 
 # --- FIREBASE BAŞLATMA ---
 if not firebase_admin._apps:
@@ -59,10 +88,10 @@ if not firebase_admin._apps:
     except Exception as e:
         print(f"⚠️ Firebase başlatma hatası: {e}")
 
-db = firestore.client()
+db = firestore_async.client()
 bucket = storage.bucket()
 
-app = FastAPI(title="Hirelytics Backend API", version="3.0.0")
+app = FastAPI(title="Hirelytics Backend API", version="3.0.0", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -106,31 +135,115 @@ class AnalysisRequest(BaseModel):
     cv_content: str
 
 
-# --- AI AGENT SINIFI (Aynı Kalıyor) ---
-class HirelyticsAgent:
-    def __init__(self):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if ADK_AVAILABLE and self.api_key:
-            self.client = Client(api_key=self.api_key)
-        else:
-            self.client = None
+# 4. Toplu Analiz İsteği Modeli
+class BatchAnalysisRequest(BaseModel):
+    job_id: str
+    candidate_ids: List[str]
 
-    def analyze(self, job_desc: str, cv_text: str, candidate_name: str):
-        if not self.client:
-            return self._mock_response(candidate_name)
 
-        prompt = f"""
-           Sen bir işe alım uzmanısın. Aşağıdaki iş tanımı ve CV'yi analiz et.
+# 5. Analiz Sonucu Modelleri
+# LLM snake_case üretir, Firestore'da da öyle saklanır; frontend için by_alias=True ile camelCase verilir.
+class AnalysisScores(BaseModel):
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True)
 
-           İŞ TANIMI:
-           {job_desc}
+    total_score: Union[int, float] = 0
+    skill_match: Union[int, float] = 0
+    experience_match: Union[int, float] = 0
+    keyword_match: Union[int, float] = 0
+
+
+class AnalysisDetails(BaseModel):
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True)
+
+    summary: str = "Özet yok"
+    strengths: List[str] = Field(default_factory=list)
+    missing_skills: List[str] = Field(default_factory=list)
+
+
+class AnalysisResponse(BaseModel):
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True)
+
+    candidate_name: Optional[str] = None
+    scores: AnalysisScores = Field(default_factory=AnalysisScores)
+    analysis: AnalysisDetails = Field(default_factory=AnalysisDetails)
 
-           ADAY CV'Sİ ({candidate_name}):
-           {cv_text}
 
-           ÇIKTI FORMATI (Sadece saf JSON döndür, markdown kullanma):
+ANALYSIS_LIST_ADAPTER = TypeAdapter(List[AnalysisResponse])
+
+
+# 6. LLM Çıktı Modelleri
+# Yukarıdakiler eski/eksik kayıtları varsayılanlarla okur; Gemini çıktısı ise tüm alanları
+# içermek zorunda. Eksik alanlı ({} gibi) cevap doğrulamadan geçmez ve yeniden denenir.
+class LLMAnalysisScores(BaseModel):
+    total_score: Union[int, float] = Field(ge=0, le=100)
+    skill_match: Union[int, float] = Field(ge=0, le=100)
+    experience_match: Union[int, float] = Field(ge=0, le=100)
+    keyword_match: Union[int, float] = Field(ge=0, le=100)
+
+
+class LLMAnalysisDetails(BaseModel):
+    summary: str = Field(min_length=1)
+    strengths: List[str]
+    missing_skills: List[str]
+
+
+class LLMAnalysisResponse(BaseModel):
+    candidate_name: str
+    scores: LLMAnalysisScores
+    analysis: LLMAnalysisDetails
+
+
+LLM_ANALYSIS_LIST_ADAPTER = TypeAdapter(List[LLMAnalysisResponse])
+
+# Gemini structured output şemaları (snake_case alan adları, hepsi required)
+ANALYSIS_JSON_SCHEMA = LLMAnalysisResponse.model_json_schema()
+ANALYSIS_LIST_JSON_SCHEMA = LLM_ANALYSIS_LIST_ADAPTER.json_schema()
+
+
+# Analiz için kullanılan Gemini modeli
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Tek Gemini çağrısında analiz edilecek maksimum aday sayısı (context sınırı)
+MAX_BATCH_SIZE = 8
+# Kabul edilen maksimum CV dosya boyutu
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+# /api/upload-cvs ile tek istekte yüklenebilecek dosya sayısı
+MAX_FILES_PER_UPLOAD = int(os.getenv("MAX_FILES_PER_UPLOAD", "20"))
+# CV ayrıştırma process havuzu boyutu (pypdf/docx saf Python; GIL'e takılmasın)
+# Varsayılan: CPU'lar uvicorn worker'ları (WEB_CONCURRENCY) arasında bölüştürülür, worker başına en az 1
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+CV_PARSE_WORKERS = int(os.getenv("CV_PARSE_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+# /api/jobs cevabının süreç içi cache süresi (sn); yazma endpoint'leri cache'i temizler
+JOBS_CACHE_TTL = float(os.getenv("JOBS_CACHE_TTL", "10"))
+_jobs_cache = {}  # 'all' -> (expires_at, etag, jobs)
+# Firestore'un tek WriteBatch commit'indeki yazma sınırı
+FIRESTORE_BATCH_LIMIT = 500
+# Dosyalar Storage'a yüklenmiyor, sadece metin saklanıyor
+FAKE_CV_URL = "https://text-only-mode.com"
+# Bellek içi analiz cache'inin kapasitesi (LRU) ve kayıtların ömrü (saniye)
+ANALYSIS_CACHE_SIZE = 512
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+# Aynı CV dosyası tekrar yüklenince ayrıştırma atlanır (içerik hash'i -> metin)
+CV_TEXT_CACHE_TTL = int(os.getenv("CV_TEXT_CACHE_TTL", str(7 * 86400)))
+
+
+# Gemini context cache ömrü (saniye); aynı ilana gelen adaylar bu süre içinde prefix'i yeniden kullanır
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+# Gemini context cache için minimum prefix uzunluğu: 2.5 Flash en az 1024 token ister (~4 karakter/token)
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_CHARS", "4096"))
+
+# Aynı anda Gemini'ye gidebilecek istek sayısı (projenin QPM kotasına göre ayarla)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = 3
+# /api/analyze-job içinde aynı anda işlenen aday sayısı (Gemini çağrıları ayrıca LLM_MAX_CONCURRENCY ile sınırlı)
+ANALYZE_JOB_CONCURRENCY = int(os.getenv("ANALYZE_JOB_CONCURRENCY", "8"))
+# Tekrar denenebilir HTTP kodları (rate limit / geçici sunucu hatası)
+RETRYABLE_STATUS_CODES = {429, 500, 503}
+
+# --- PROMPT ŞABLONLARI ---
+# Tek aday için beklenen JSON nesnesi (format() şablonu; süslü parantezler kaçışlı)
+ANALYSIS_OUTPUT_FORMAT = """
            {{
-               "candidate_name": "{candidate_name}",
+               "candidate_name": "adayın adı",
                "scores": {{
                    "skill_match": 0-100,
                    "experience_match": 0-100,
@@ -144,24 +257,392 @@ class HirelyticsAgent:
                }}
            }}
            """
+
+# Sabit kısım (talimat + iş tanımı + çıktı formatı) önde: Gemini context caching için ortak prefix
+ANALYSIS_PROMPT_PREFIX = """
+           Sen bir işe alım uzmanısın. Aşağıdaki iş tanımı ve CV'yi analiz et.
+
+           İŞ TANIMI:
+           {job_desc}
+
+           ÇIKTI FORMATI (Sadece saf JSON döndür, markdown kullanma):""" + ANALYSIS_OUTPUT_FORMAT
+
+# Adaya özel kısım
+CANDIDATE_PROMPT = """
+           ADAY CV'Sİ ({candidate_name}):
+           {cv_text}
+           """
+
+# Toplu analiz: aynı iş tanımı + numaralandırılmış CV blokları, çıktı aday sırasıyla liste
+BATCH_ANALYSIS_PROMPT = """
+           Sen bir işe alım uzmanısın. Aşağıdaki iş tanımına göre numaralandırılmış her adayın CV'sini analiz et.
+
+           İŞ TANIMI:
+           {job_desc}
+           {cv_blocks}
+           ÇIKTI FORMATI (Sadece saf JSON listesi döndür, markdown kullanma).
+           Listede her aday için aday numarası sırasıyla bir nesne olmalı:
+           [""" + ANALYSIS_OUTPUT_FORMAT + """]
+           """
+
+BATCH_CANDIDATE_PROMPT = """
+           ADAY #{index} ({candidate_name}):
+           {cv_text}
+"""
+
+# Prompt'a girecek metinlerin üst sınırı (karakter) - uzun CV'ler token maliyetini şişirmesin
+MAX_CV_CHARS = int(os.getenv("MAX_CV_CHARS", "8000"))
+MAX_JOB_DESC_CHARS = int(os.getenv("MAX_JOB_DESC_CHARS", "2000"))
+# Gemini context cache'ine konan iş tanımının üst sınırı (cache'li prompt kırpılmamış iş tanımını kullanır)
+MAX_CACHED_JOB_DESC_CHARS = int(os.getenv("MAX_CACHED_JOB_DESC_CHARS", "30000"))
+
+# Bütçenin bu kadarından azı kalınca yeni paragraf eklenmez
+MIN_TRIMMED_PARAGRAPH_CHARS = 200
+
+WORD_RE = re.compile(r"\w[\w+#.-]*\w|\w", re.UNICODE)
+
+
+def _trim(text: str, max_chars: int) -> str:
+    """Uzun metnin baş ve sonunu korur, ortasını atar."""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return text[:half] + "\n...\n" + text[-half:]
+
+
+def _keywords(text: str) -> set:
+    return {w for w in WORD_RE.findall(text.lower()) if len(w) > 2}
+
+
+def _trim_cv(cv_text: str, job_desc: str, max_chars: int = MAX_CV_CHARS) -> str:
+    """
+    Uzun CV'de iş tanımındaki kelimeleri en çok içeren paragrafları seçer
+    (orijinal sırada). Bütçeyi aşan paragraf _trim ile kısaltılarak alınır.
+    """
+    if len(cv_text) <= max_chars:
+        return cv_text
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", cv_text) if p.strip()]
+    jd_words = _keywords(job_desc)
+    if len(paragraphs) < 2 or not jd_words:
+        return _trim(cv_text, max_chars)
+
+    ranked = sorted(
+        range(len(paragraphs)),
+        key=lambda i: len(_keywords(paragraphs[i]) & jd_words),
+        reverse=True
+    )
+    keep, total = {}, 0  # paragraf indeksi -> (gerekirse kısaltılmış) metin
+    for i in ranked:
+        remaining = max_chars - total - 2
+        if remaining < MIN_TRIMMED_PARAGRAPH_CHARS:
+            break
+        # Sığmayan paragraf atlanmaz, kalan bütçeye kısaltılır (ilgili paragraflar öncelikli)
+        text = paragraphs[i] if len(paragraphs[i]) <= remaining else _trim(paragraphs[i], remaining - 5)
+        keep[i] = text
+        total += len(text) + 2
+    return "\n\n".join(keep[i] for i in sorted(keep))
+
+
+# --- CACHE ---
+class FirestoreCache:
+    """
+    İki katmanlı cache: bellek içi LRU + Firestore koleksiyonu (LLM cevapları, CV metinleri).
+    Kayıtlar TTL sonunda geçersiz sayılır; isabet/ıska sayaçları tutulur.
+    """
+
+    def __init__(self, collection: str, max_size: int = ANALYSIS_CACHE_SIZE, ttl: int = ANALYSIS_CACHE_TTL):
+        self.collection = collection
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.time():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        try:
+            doc_ref = db.collection(self.collection).document(key)
+            doc = await doc_ref.get()
+            if doc.exists:
+                data = doc.to_dict()
+                expires_at = data.get('expires_at', 0)
+                # Eski kayıtlarda float epoch, yenilerde Timestamp (Firestore TTL politikası için)
+                if isinstance(expires_at, datetime):
+                    expires_at = expires_at.timestamp()
+                if expires_at > time.time():
+                    self._remember(key, data['result'], expires_at)
+                    self.hits += 1
+                    return data['result']
+                # Süresi dolmuş kayıt (CV metni/analiz, kişisel veri) okununca silinir
+                await doc_ref.delete()
+        except Exception as e:
+            print(f"Cache okuma hatası: {e}")
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict, ttl: Optional[int] = None):
+        expires_at = time.time() + (ttl or self.ttl)
+        self._remember(key, value, expires_at)
+        try:
+            await db.collection(self.collection).document(key).set({
+                'result': value,
+                'ts': datetime.now().isoformat(),
+                # Timestamp: koleksiyonlarda expires_at üzerinde TTL politikası tanımlı (firestore.indexes.json)
+                'expires_at': datetime.fromtimestamp(expires_at, tz=timezone.utc)
+            })
+        except Exception as e:
+            print(f"Cache yazma hatası: {e}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+cv_text_cache = FirestoreCache('cv_text_cache', ttl=CV_TEXT_CACHE_TTL)
+
+
+# --- AI AGENT SINIFI (Aynı Kalıyor) ---
+class HirelyticsAgent:
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.api_key = os.getenv("GOOGLE_API_KEY")
+        if ADK_AVAILABLE and self.api_key:
+            http_options = types.HttpOptions(httpx_async_client=http_client) if http_client else None
+            self.client = Client(api_key=self.api_key, http_options=http_options)
+        else:
+            self.client = None
+        # (model, iş tanımı, CV) -> analiz sonucu
+        self.cache = FirestoreCache('analysis_cache')
+        # job_id -> Gemini context cache bilgisi; aynı ilan için paralel oluşturmayı kilit engeller
+        self._context_caches = {}
+        # (job_id, prefix_hash) -> bu zamana kadar tekrar deneme (başarısız oluşturma)
+        self._context_cache_failures = {}
+        self._context_cache_locks = defaultdict(asyncio.Lock)
+        # Tüm isteklerde eşzamanlı Gemini çağrılarını sınırla
+        self._llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+    async def _generate_json(self, parse, **kwargs):
+        """
+        generate_content çağrısını (async client) JSON modunda yapar ve parse(text)
+        ile doğrular. Geçici API hataları (429/5xx) ve şemaya uymayan cevaplar aynı
+        deneme bütçesini (LLM_MAX_RETRIES) paylaşır; aralarda exponential backoff + jitter.
+        """
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                async with self._llm_semaphore:
+                    response = await self.client.aio.models.generate_content(**kwargs)
+                return parse(response.text)
+            except ValueError as e:  # pydantic ValidationError da ValueError
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                reason = f"Geçersiz JSON ({e.__class__.__name__})"
+            except Exception as e:
+                if getattr(e, "code", None) not in RETRYABLE_STATUS_CODES or attempt == LLM_MAX_RETRIES:
+                    raise
+                reason = f"Gemini {e.code}"
+            delay = random.uniform(0, 2 ** (attempt + 1))
+            print(f"⏳ {reason}, {delay:.1f} sn sonra tekrar denenecek ({attempt + 1}/{LLM_MAX_RETRIES})")
+            # Bekleme sırasında semafor serbest, diğer istekler ilerleyebilir
+            await asyncio.sleep(delay)
+
+    async def analyze(self, job_desc: str, cv_text: str, candidate_name: str, job_id: Optional[str] = None):
+        if not self.client:
+            return self._mock_response(candidate_name)
+
+        cache_key = FirestoreCache.make_key(model=GEMINI_MODEL, jd=job_desc, cv=cv_text)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "candidate_name": candidate_name}
+
+        cv_text = _trim_cv(cv_text, job_desc)
+        candidate_part = CANDIDATE_PROMPT.format(candidate_name=candidate_name, cv_text=cv_text)
+        # Uzun iş tanımı kırpılmadan Gemini'de cache'lenir (cache'li token ucuz, her adayda tekrar gönderilmez).
+        # Kısa iş tanımı modelin cache minimumuna ulaşmaz; o zaman kırpılmış prefix her istekte gönderilir.
+        cached_prefix = ANALYSIS_PROMPT_PREFIX.format(job_desc=_trim(job_desc, MAX_CACHED_JOB_DESC_CHARS))
+        context_cache = await self._get_context_cache(job_id, cached_prefix) if job_id else None
+        prompt_prefix = ANALYSIS_PROMPT_PREFIX.format(job_desc=_trim(job_desc, MAX_JOB_DESC_CHARS))
+
+        def parse(text: str) -> dict:
+            return LLMAnalysisResponse.model_validate_json(text).model_dump()
+
+        try:
+            # İş tanımı Gemini tarafında cache'liyse sadece CV gönderilir
+            result = await self._generate_json(
+                parse,
+                model=GEMINI_MODEL,
+                contents=candidate_part if context_cache else prompt_prefix + candidate_part,
+                config=self._analysis_config(context_cache)
+            )
+        except Exception as e:
+            if not context_cache:
+                print(f"Agent Error: {e}")
+                return self._mock_response(candidate_name, str(e))
+            # Cache silinmiş/geçersiz olabilir: bir kez tam prompt ile dene
+            print(f"Context cache ile analiz başarısız, tam prompt deneniyor ({job_id}): {e}")
+            self._drop_context_cache(job_id, cached_prefix)
+            try:
+                result = await self._generate_json(
+                    parse,
+                    model=GEMINI_MODEL,
+                    contents=prompt_prefix + candidate_part,
+                    config=self._analysis_config(None)
+                )
+            except Exception as e:
+                print(f"Agent Error: {e}")
+                return self._mock_response(candidate_name, str(e))
+        result["candidate_name"] = candidate_name
+        await self.cache.set(cache_key, result)
+        return result
+
+    @staticmethod
+    def _analysis_config(cached_content: Optional[str]):
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_json_schema=ANALYSIS_JSON_SCHEMA,
+            cached_content=cached_content
+        )
+
+    async def analyze_batch(self, job_desc: str, candidates: List[tuple]):
+        """
+        Aynı iş ilanı için birden fazla adayı tek Gemini çağrısıyla analiz eder.
+        candidates: [(candidate_name, cv_text), ...] - en fazla MAX_BATCH_SIZE
+        Analiz cache'inde olan adaylar Gemini'ye gönderilmez. Sonuçlar girdi sırasıyla döner.
+        """
+        names = [name for name, _ in candidates]
+        if not self.client:
+            return [self._mock_response(name) for name in names]
+
+        # analyze() ile aynı anahtar: tekli ve toplu analiz cache'i paylaşır
+        keys = [FirestoreCache.make_key(model=GEMINI_MODEL, jd=job_desc, cv=cv_text) for _, cv_text in candidates]
+        cached = await asyncio.gather(*[self.cache.get(key) for key in keys])
+        results = [
+            {**hit, "candidate_name": name} if hit is not None else None
+            for name, hit in zip(names, cached)
+        ]
+        missing = [i for i, res in enumerate(results) if res is None]
+        if not missing:
+            return results
+
+        cv_blocks = "\n".join(
+            BATCH_CANDIDATE_PROMPT.format(
+                index=n, candidate_name=names[i], cv_text=_trim_cv(candidates[i][1], job_desc)
+            )
+            for n, i in enumerate(missing)
+        )
+        prompt = BATCH_ANALYSIS_PROMPT.format(job_desc=_trim(job_desc, MAX_JOB_DESC_CHARS), cv_blocks=cv_blocks)
+
+        def parse(text: str) -> List[dict]:
+            parsed = LLM_ANALYSIS_LIST_ADAPTER.validate_json(text)
+            if len(parsed) != len(missing):
+                raise ValueError(f"Beklenen {len(missing)} sonuç, gelen {len(parsed)}")
+            return [res.model_dump() for res in parsed]
+
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            fresh = await self._generate_json(
+                parse,
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_json_schema=ANALYSIS_LIST_JSON_SCHEMA
+                )
             )
-            text = response.text.strip()
-            # Markdown temizliği
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
         except Exception as e:
-            print(f"Agent Error: {e}")
-            return self._mock_response(candidate_name, str(e))
+            print(f"Agent Batch Error: {e}")
+            for i in missing:
+                results[i] = self._mock_response(names[i], str(e))
+            return results
+
+        for i, result in zip(missing, fresh):
+            result["candidate_name"] = names[i]
+            results[i] = result
+        await asyncio.gather(*[self.cache.set(keys[i], results[i]) for i in missing])
+        return results
+
+    async def _get_context_cache(self, job_id: str, prompt_prefix: str) -> Optional[str]:
+        """
+        İlan başına bir Gemini context cache oluşturur ve adını iş dokümanında saklar.
+        Prefix model için çok kısaysa veya API hata verirse None döner (normal prompt kullanılır).
+        """
+        if len(prompt_prefix) < CONTEXT_CACHE_MIN_CHARS:
+            return None
+        prefix_hash = self._prefix_hash(prompt_prefix)
+
+        # Hızlı yol kilitsiz: hazır cache veya yakın zamanda başarısız olmuş oluşturma
+        name = self._usable_context_cache(job_id, prefix_hash)
+        if name or self._context_cache_failures.get((job_id, prefix_hash), 0) > time.time():
+            return name
+
+        job_ref = db.collection('jobs').document(job_id)
+        async with self._context_cache_locks[job_id]:
+            # Kilit beklenirken başka bir istek oluşturmuş / başarısız olmuş olabilir
+            name = self._usable_context_cache(job_id, prefix_hash)
+            if name or self._context_cache_failures.get((job_id, prefix_hash), 0) > time.time():
+                return name
+            try:
+                if job_id not in self._context_caches:
+                    job_doc = await job_ref.get()
+                    entry = job_doc.to_dict().get('gemini_cache') if job_doc.exists else None
+                    if entry:
+                        self._context_caches[job_id] = entry
+                        name = self._usable_context_cache(job_id, prefix_hash)
+                        if name:
+                            return name
+
+                cache = await self.client.aio.caches.create(
+                    model=GEMINI_MODEL,
+                    config=types.CreateCachedContentConfig(
+                        contents=[prompt_prefix],
+                        ttl=f"{CONTEXT_CACHE_TTL}s"
+                    )
+                )
+                entry = {
+                    'name': cache.name,
+                    'prefix_hash': prefix_hash,
+                    'expires_at': time.time() + CONTEXT_CACHE_TTL
+                }
+                self._context_caches[job_id] = entry
+                await job_ref.update({'gemini_cache': entry})
+                return entry['name']
+            except Exception as e:
+                print(f"Context cache kullanılamadı ({job_id}): {e}")
+                # Aynı prefix için her analizde başarısız RPC tekrarlanmasın
+                self._context_cache_failures[(job_id, prefix_hash)] = time.time() + CONTEXT_CACHE_TTL
+                return None
+
+    @staticmethod
+    def _prefix_hash(prompt_prefix: str) -> str:
+        # Model değişince eski modelle oluşturulmuş cache kullanılmasın
+        return hashlib.sha256(f"{GEMINI_MODEL}\n{prompt_prefix}".encode()).hexdigest()
+
+    def _drop_context_cache(self, job_id: str, prompt_prefix: str):
+        """Çağrıda reddedilen cache'i bırakır; TTL boyunca bu prefix için yeniden denenmez."""
+        self._context_caches.pop(job_id, None)
+        self._context_cache_failures[(job_id, self._prefix_hash(prompt_prefix))] = time.time() + CONTEXT_CACHE_TTL
+
+    def _usable_context_cache(self, job_id: str, prefix_hash: str) -> Optional[str]:
+        entry = self._context_caches.get(job_id)
+        # Süresi dolmak üzere olanlar kullanılmaz, yeniden oluşturulur (60 sn pay)
+        if entry and entry.get('prefix_hash') == prefix_hash and entry.get('expires_at', 0) > time.time() + 60:
+            return entry['name']
+        return None
 
     def _mock_response(self, name, error=None):
+        # is_mock: endpoint'ler bu sonucu kaydetmez; aday analiz edilmemiş sayılmaya devam eder
         return {
+            "is_mock": True,
             "candidate_name": name,
             "scores": {
                 "total_score": 75,      # snake_case (get_jobs bunu camelCase'e çevirecek)
@@ -177,14 +658,217 @@ class HirelyticsAgent:
         }
 
 
-agent = HirelyticsAgent()
+# Süreç başına tek agent (ve tek genai Client); app.state üzerinden de erişilebilir
+agent = HirelyticsAgent(http_client=GEMINI_HTTP_CLIENT)
+app.state.agent = agent
+app.state.http = GEMINI_HTTP_CLIENT
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+async def _parse_upload(file: UploadFile) -> str:
+    """Yüklenen CV'yi boyut kontrolünden geçirip process havuzunda ayrıştırır."""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise CVRejectedError(f"{file.filename}: CV dosyası {MAX_UPLOAD_BYTES // (1024 * 1024)} MB sınırını aşıyor")
+    # Sınırın bir bayt fazlası okunur; fazlası varsa dosya büyüktür (tek kopya, ek tampon yok)
+    file_bytes = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(file_bytes) > MAX_UPLOAD_BYTES:
+        raise CVRejectedError(f"{file.filename}: CV dosyası {MAX_UPLOAD_BYTES // (1024 * 1024)} MB sınırını aşıyor")
+    filename = file.filename.lower()
+
+    # Ayrıştırıcı uzantıya göre seçildiği için anahtara uzantı da giriyor
+    cache_key = hashlib.sha256(file_bytes).hexdigest() + os.path.splitext(filename)[1]
+    cached = await cv_text_cache.get(cache_key)
+    if cached is not None:
+        return cached['text']
+
+    loop = asyncio.get_running_loop()
+    text, truncated = await loop.run_in_executor(app.state.cv_pool, parse_bytes, file_bytes, filename)
+    # Süre sınırına takılıp eksik kalan metin cache'lenmez; sonraki yüklemede tekrar denenir
+    if not truncated:
+        await cv_text_cache.set(cache_key, {'text': text})
+    return text
+
+
+def _new_candidate(filename: str, content: str, candidate_id: str = "unknown",
+                   email: str = "unknown") -> dict:
+    now = datetime.now().isoformat()
+    return {
+        "candidate_id": candidate_id,
+        "email": email,
+        "name": filename,
+        "cv_url": FAKE_CV_URL,
+        "content": content.strip(),
+        "isParsed": True,
+        "appliedAt": now,
+        "updatedAt": now,
+        "analysis_result": None
+    }
+
+
+async def _latest_updated_at(query) -> str:
+    docs = await query.order_by('updatedAt', direction=firestore.Query.DESCENDING).limit(1).get()
+    return docs[0].to_dict().get('updatedAt', '') if docs else ''
+
+
+def _invalidate_jobs_cache():
+    _jobs_cache.pop('all', None)
+
+
+async def _jobs_etag() -> str:
+    """
+    /api/jobs için ETag: ilan ve adaylardaki en yeni updatedAt değerinden türetilir.
+    Tüm veriyi okumadan iki tek-dokümanlık sorgu ile hesaplanır.
+    """
+    jobs_ts, cands_ts = await asyncio.gather(
+        _latest_updated_at(db.collection('jobs')),
+        _latest_updated_at(db.collection_group('candidates')),
+    )
+    return '"' + hashlib.sha256(f"{jobs_ts}|{cands_ts}".encode()).hexdigest()[:32] + '"'
+
+
+async def _commit_batched(writes: List[tuple]):
+    """
+    [(ref, data), ...] yazmalarını set(merge=True) ile WriteBatch'lere böler
+    (her biri en fazla FIRESTORE_BATCH_LIMIT) ve commit'leri paralel gönderir.
+    """
+    commits = []
+    for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for ref, data in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+            batch.set(ref, data, merge=True)
+        commits.append(batch.commit())
+    await asyncio.gather(*commits)
+
+
+def _frontend_results(results: List[dict], names: List[str]) -> List[dict]:
+    """Analiz sonuçlarını frontend'in beklediği camelCase formata tek seferde çevirir."""
+    # Frontend (React) camelCase beklerken, AI snake_case üretiyor.
+    # Eksik alanlar modeldeki varsayılanlarla dolar; liste tek validate/dump çağrısıyla işlenir.
+    try:
+        shaped = ANALYSIS_LIST_ADAPTER.dump_python(ANALYSIS_LIST_ADAPTER.validate_python(results), by_alias=True)
+    except ValidationError:
+        # Eski (şemasız) kayıtlardan biri bozuksa tüm liste düşmesin; kayıt kayıt dönüştür
+        shaped = [_frontend_shape(res) for res in results]
+    for item, name in zip(shaped, names):
+        item["candidateName"] = item["candidateName"] or name
+        item.setdefault("isError", False)
+    return shaped
+
+
+def _frontend_shape(result) -> dict:
+    try:
+        return AnalysisResponse.model_validate(result).model_dump(by_alias=True)
+    except ValidationError as e:
+        print(f"Geçersiz analiz kaydı, varsayılanlar kullanılıyor: {e.error_count()} hata")
+        shaped = AnalysisResponse().model_dump(by_alias=True)
+        shaped["isError"] = True
+        return shaped
+
+
+def _frontend_result(result: dict, candidate_name: str) -> dict:
+    return _frontend_results([result], [candidate_name])[0]
+
+
+async def _load_jobs() -> List[dict]:
+    """Tüm ilanları adayları ve frontend formatındaki analiz sonuçlarıyla birlikte okur."""
+    # İlanlar ve tüm adaylar iki sorguda, paralel çekiliyor (ilan başına RPC yok)
+    job_docs, cand_docs = await asyncio.gather(
+        db.collection('jobs').get(),
+        db.collection_group('candidates').get(),
+    )
+
+    jobs = {}
+    for d in job_docs:
+        job_data = d.to_dict()
+        # analysisResults analiz anında ilan dokümanına {candidate_id: sonuç} olarak yazılıyor.
+        # Not: map aday sayısıyla büyür (Firestore doküman sınırı 1 MiB; aday başına ~1 KB) ve her
+        # analiz aynı ilan dokümanına yazar; çok büyük/yoğun ilanlar için ayrı koleksiyona taşınmalı.
+        job_data['analysisResults'] = job_data.get('analysisResults') or {}
+        jobs[d.id] = {**job_data, 'id': d.id, 'candidates': []}
+
+    legacy = []  # [(job_data, candidate_id, name, analysis_result)]
+    for c in cand_docs:
+        job_data = jobs.get(c.reference.parent.parent.id)
+        if job_data is None:
+            continue
+        c_data = c.to_dict()
+        c_data['id'] = c.id
+        job_data['candidates'].append(c_data)
+
+        # Denormalizasyondan önce analiz edilmiş eski kayıtlar sonradan toplu dönüştürülür
+        res = c_data.get('analysis_result')
+        if res and c.id not in job_data['analysisResults']:
+            legacy.append((job_data, c.id, c_data.get('name'), res))
+
+    if legacy:
+        shaped = _frontend_results([res for *_, res in legacy], [name for _, _, name, _ in legacy])
+        for (job_data, cid, _, _), result in zip(legacy, shaped):
+            job_data['analysisResults'][cid] = result
+
+    for job_data in jobs.values():
+        # Silinmiş/var olmayan adaylara ait kayıtlar gösterilmez
+        candidate_ids = {c['id'] for c in job_data['candidates']}
+        job_data['analysisResults'] = [
+            res for cid, res in job_data['analysisResults'].items() if cid in candidate_ids
+        ]
+    return list(jobs.values())
+
+
+def _decode_jwt_payload(token: str) -> dict:
+    """JWT'nin payload kısmını imza doğrulamadan çözer."""
+    payload = token.split(".")[1]
+    payload += "=" * (-len(payload) % 4)
+    return orjson.loads(base64.urlsafe_b64decode(payload))
+
+
+@app.on_event("startup")
+async def _configure_thread_pool():
+    # Bloklayan işler (Firebase Auth) to_thread ile çalışıyor; havuzu büyüt
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(os.getenv("THREAD_POOL_SIZE", "64"))
+
+
+@app.on_event("startup")
+async def _start_cv_pool():
+    # spawn: fork, ana süreçteki gRPC (Firestore) kanallarıyla güvenli değil
+    app.state.cv_pool = ProcessPoolExecutor(
+        max_workers=CV_PARSE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+@app.on_event("startup")
+async def _warm_up_clients():
+    # İlk kullanıcı isteği gRPC kanalı/OAuth ve Gemini TLS kurulumunu beklemesin
+    start = time.perf_counter()
+    try:
+        await db.collection('jobs').limit(1).get()
+        print(f"🔥 Firestore ısındı ({time.perf_counter() - start:.2f} sn)")
+    except Exception as e:
+        print(f"⚠️ Firestore warmup hatası: {e}")
+
+    if agent.client:
+        start = time.perf_counter()
+        try:
+            await agent.client.aio.models.list()
+            print(f"🔥 Gemini client ısındı ({time.perf_counter() - start:.2f} sn)")
+        except Exception as e:
+            print(f"⚠️ Gemini warmup hatası: {e}")
+
+
+@app.on_event("shutdown")
+async def _close_http_clients():
+    await LOGIN_CLIENT.aclose()
+    await GEMINI_HTTP_CLIENT.aclose()
+    app.state.cv_pool.shutdown(wait=False, cancel_futures=True)
 
 
 # --- ENDPOINTS ---
 
 @app.get("/")
 def health_check():
-    return {"status": "Hirelytics Backend V3 Çalışıyor"}
+    return {"status": "Hirelytics Backend V3 Çalışıyor", "llm_cache": agent.cache.stats(),
+            "cv_text_cache": cv_text_cache.stats()}
 
 
 # --- 1. AUTH İŞLEMLERİ (TAMAMEN BACKEND) ---
@@ -193,12 +877,14 @@ def health_check():
 async def register_user(request: UserRegisterRequest):
     """
     1. Firebase Auth'da kullanıcı oluşturur (Admin SDK).
-    2. Firestore'a kullanıcı rolünü kaydeder.
+    2. Rolü custom claim olarak token'a ekler (login'de Firestore okuması gerekmez).
+    3. Firestore'a kullanıcı rolünü kaydeder (admin arayüzü için).
     """
     try:
         # 1. Firebase Auth Kullanıcısı Oluştur
         try:
-            user_record = auth.create_user(
+            user_record = await asyncio.to_thread(
+                auth.create_user,
                 email=request.email,
                 password=request.password
             )
@@ -217,14 +903,17 @@ async def register_user(request: UserRegisterRequest):
             else:
                 raise HTTPException(status_code=400, detail=f"Firebase Kayıt Hatası: {error_message}")
 
-        # 2. Firestore'a Rol Kaydet
+        # 2. Rolü ID token'a göm
+        await asyncio.to_thread(auth.set_custom_user_claims, user_record.uid, {"role": request.role})
+
+        # 3. Firestore'a Rol Kaydet
         user_data = {
             "uid": user_record.uid,
             "email": request.email,
             "role": request.role,
             "createdAt": datetime.now().isoformat()
         }
-        db.collection('users').document(user_record.uid).set(user_data)
+        await db.collection('users').document(user_record.uid).set(user_data)
 
         return {"message": "Kayıt başarılı", "uid": user_record.uid, "role": request.role}
 
@@ -239,7 +928,7 @@ async def register_user(request: UserRegisterRequest):
 async def login_user(request: UserLoginRequest):
     """
     1. Firebase REST API kullanarak şifre doğrular.
-    2. Firestore'dan kullanıcının rolünü çeker.
+    2. Rolü ID token'daki custom claim'den okur (eski kullanıcılar için Firestore'a düşer).
     """
     if not FIREBASE_WEB_API_KEY:
         raise HTTPException(status_code=500, detail="Backend configuration error: FIREBASE_WEB_API_KEY eksik.")
@@ -253,8 +942,8 @@ async def login_user(request: UserLoginRequest):
     }
 
     try:
-        response = requests.post(login_url, json=payload)
-        res_json = response.json()
+        response = await LOGIN_CLIENT.post(login_url, json=payload)
+        res_json = orjson.loads(response.content)
 
         if "error" in res_json:
             error_msg = res_json['error']['message']
@@ -265,13 +954,16 @@ async def login_user(request: UserLoginRequest):
         local_id = res_json['localId']  # UID
         id_token = res_json['idToken']
 
-        # 2. Firestore'dan Rolü Getir
-        user_doc = db.collection('users').document(local_id).get()
-        if not user_doc.exists:
-            raise HTTPException(status_code=404, detail="Kullanıcı profili bulunamadı.")
+        # 2. Rolü token'dan oku (token doğrudan Google'dan geldi, imza kontrolüne gerek yok)
+        role = _decode_jwt_payload(id_token).get('role')
+        if role is None:
+            # Custom claim'den önce kayıt olmuş kullanıcılar
+            user_doc = await db.collection('users').document(local_id).get()
+            if not user_doc.exists:
+                raise HTTPException(status_code=404, detail="Kullanıcı profili bulunamadı.")
 
-        user_data = user_doc.to_dict()
-        role = user_data.get('role', 'candidate')  # Varsayılan candidate
+            user_data = user_doc.to_dict()
+            role = user_data.get('role', 'candidate')  # Varsayılan candidate
 
         return {
             "uid": local_id,
@@ -290,68 +982,41 @@ async def login_user(request: UserLoginRequest):
 
 # --- 2. İŞ İLANI İŞLEMLERİ (Aynı) ---
 @app.get("/api/jobs")
-# --- agent.py dosyasındaki get_jobs fonksiyonunu bununla değiştir ---
+async def get_jobs(request: Request, response: Response):
+    # Dashboard polling: önce süreç içi cache, sonra ETag; veri değişmediyse 304
+    cached = _jobs_cache.get('all')
+    if cached and cached[0] > time.time():
+        _, etag, all_jobs = cached
+    else:
+        all_jobs = None
+        try:
+            etag = await _jobs_etag()
+        except Exception as e:
+            # Örn. candidates.updatedAt için collection group index'i yoksa (firestore.indexes.json)
+            print(f"ETag sorgusu başarısız, veriden hesaplanacak: {e}")
+            etag = None
+    if etag and request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={"ETag": etag})
 
-@app.get("/api/jobs")
-async def get_jobs():
-    try:
-        jobs_ref = db.collection('jobs')
-        docs = jobs_ref.stream()
-        all_jobs = []
-
-        for doc in docs:
-            job_data = doc.to_dict()
-            job_data['id'] = doc.id
-
-            # Adayları çek
-            candidates = []
-            cand_ref = jobs_ref.document(doc.id).collection('candidates')
-            for c in cand_ref.stream():
-                c_data = c.to_dict()
-                c_data['id'] = c.id
-                candidates.append(c_data)
-
-            job_data['candidates'] = candidates
-
-            # --- DÜZELTME BURADA YAPILDI ---
-            # Frontend (React) camelCase beklerken, AI snake_case üretiyor.
-            # Bu yüzden burada manuel eşleştirme (mapping) yapıyoruz.
-            results = []
-            for c in candidates:
-                if c.get('analysis_result'):
-                    res = c['analysis_result']
-
-                    # Güvenli veri çekme (Hata almamak için boş sözlük {})
-                    scores = res.get("scores", {})
-                    analysis = res.get("analysis", {})
-
-                    results.append({
-                        "candidateName": res.get("candidate_name", c.get('name')),
-                        "scores": {
-                            # Python (total_score) -> React (totalScore) çevirimi
-                            "totalScore": scores.get("total_score", 0),
-                            "skillMatch": scores.get("skill_match", 0),
-                            "experienceMatch": scores.get("experience_match", 0),
-                            "keywordMatch": scores.get("keyword_match", 0)
-                        },
-                        "analysis": {
-                            "summary": analysis.get("summary", "Özet yok"),
-                            "strengths": analysis.get("strengths", []),
-                            # Python (missing_skills) -> React (missingSkills) çevirimi
-                            "missingSkills": analysis.get("missing_skills", [])
-                        },
-                        "isError": False
-                    })
-
-            job_data['analysisResults'] = results
-            all_jobs.append(job_data)
-
-        return all_jobs
-    except Exception as e:
-        print(f"Get Jobs Hatası: {e}")
-        # Detaylı hata görmek için:
-        traceback.print_exc()
-        return []
+    if all_jobs is None:
+        try:
+            all_jobs = await _load_jobs()
+        except Exception as e:
+            print(f"Get Jobs Hatası: {e}")
+            # Detaylı hata görmek için:
+            traceback.print_exc()
+            # Boş liste dönülmez; aksi halde istemci onu geçerli ETag ile cache'ler
+            raise HTTPException(503, "İlanlar yüklenemedi")
+        if etag is None:
+            etag = '"' + hashlib.sha256(orjson.dumps(all_jobs, default=str)).hexdigest()[:32] + '"'
+            if request.headers.get('if-none-match') == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+        _jobs_cache['all'] = (time.time() + JOBS_CACHE_TTL, etag, all_jobs)
+
+    # Başlıklar sadece başarılı yüklemeden sonra eklenir
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, max-age=5"
+    return all_jobs
 
 
 @app.post("/api/jobs")
@@ -359,8 +1024,10 @@ async def create_job(job: JobCreate):
     try:
         new_job = job.dict()
         new_job['created_at'] = datetime.now().isoformat()
+        new_job['updatedAt'] = new_job['created_at']
         new_job['status'] = "Açık"
-        _, ref = db.collection('jobs').add(new_job)
+        _, ref = await db.collection('jobs').add(new_job)
+        _invalidate_jobs_cache()
         return {"id": ref.id, "message": "İş oluşturuldu", "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -375,36 +1042,51 @@ async def upload_cv(
         candidate_email: str = Form(default="unknown")
 ):
     try:
-        content = ""
-        file_bytes = await file.read()
-        filename = file.filename.lower()
-
-        if filename.endswith(".pdf") and PdfReader:
-            reader = PdfReader(io.BytesIO(file_bytes))
-            for page in reader.pages:
-                if page.extract_text(): content += page.extract_text() + "\n"
-        elif filename.endswith(".docx") and Document:
-            doc = Document(io.BytesIO(file_bytes))
-            for para in doc.paragraphs: content += para.text + "\n"
-        elif filename.endswith(".txt"):
-            content = file_bytes.decode("utf-8")
-        else:
-            content = "Metin okunamadı."
-
-        fake_url = "https://text-only-mode.com"
-        new_candidate = {
-            "candidate_id": candidate_id,
-            "email": candidate_email,
-            "name": file.filename,
-            "cv_url": fake_url,
-            "content": content.strip(),
-            "isParsed": True,
-            "appliedAt": datetime.now().isoformat(),
-            "analysis_result": None
+        # Ayrıştırma ayrı process'te; event loop ve GIL bloklanmaz
+        content = await _parse_upload(file)
+
+        new_candidate = _new_candidate(file.filename, content, candidate_id, candidate_email)
+        await db.collection('jobs').document(job_id).collection('candidates').add(new_candidate)
+        _invalidate_jobs_cache()
+        return {"message": "Başvuru başarılı", "url": FAKE_CV_URL}
+    except CVRejectedError as e:
+        raise HTTPException(413, str(e))
+    except Exception as e:
+        raise HTTPException(500, str(e))
+
+
+@app.post("/api/upload-cvs")
+async def upload_cvs(
+        files: List[UploadFile] = File(...),
+        job_id: str = Form(...)
+):
+    """İşverenin tek istekte birden fazla CV yüklemesi: paralel ayrıştırma + toplu batch yazma"""
+    if len(files) > MAX_FILES_PER_UPLOAD:
+        raise HTTPException(413, f"Tek istekte en fazla {MAX_FILES_PER_UPLOAD} CV yüklenebilir")
+    try:
+        # Aynı anda bellekte tutulan dosya sayısı sınırlı (her biri MAX_UPLOAD_BYTES'a kadar)
+        sem = asyncio.Semaphore(CV_PARSE_WORKERS)
+
+        async def parse_one(f):
+            async with sem:
+                return await _parse_upload(f)
+
+        contents = await asyncio.gather(*[parse_one(f) for f in files])
+
+        cand_col = db.collection('jobs').document(job_id).collection('candidates')
+        refs = [cand_col.document() for _ in files]
+        await _commit_batched([
+            (ref, _new_candidate(f.filename, content)) for ref, f, content in zip(refs, files, contents)
+        ])
+        _invalidate_jobs_cache()
+        return {
+            "message": f"{len(files)} başvuru yüklendi",
+            "candidate_ids": [ref.id for ref in refs]
         }
-        db.collection('jobs').document(job_id).collection('candidates').add(new_candidate)
-        return {"message": "Başvuru başarılı", "url": fake_url}
+    except CVRejectedError as e:
+        raise HTTPException(413, str(e))
     except Exception as e:
+        print(f"Toplu CV Yükleme Hatası: {e}")
         raise HTTPException(500, str(e))
 
 
@@ -412,12 +1094,23 @@ async def upload_cv(
 async def analyze_candidate_endpoint(request: AnalysisRequest):
     """Analiz yap ve kaydet"""
     try:
-        result = agent.analyze(request.job_description, request.cv_content, request.candidate_name)
-
-        if request.job_id and request.candidate_id:
-            db.collection('jobs').document(request.job_id) \
-                .collection('candidates').document(request.candidate_id) \
-                .update({"analysis_result": result})
+        result = await agent.analyze(
+            request.job_description, request.cv_content, request.candidate_name, request.job_id
+        )
+
+        # Gemini hatasında dönen mock sonuç kaydedilmez
+        if request.job_id and request.candidate_id and not result.get("is_mock"):
+            job_ref = db.collection('jobs').document(request.job_id)
+            cand_ref = job_ref.collection('candidates').document(request.candidate_id)
+            now = datetime.now().isoformat()
+            # Frontend formatı ilan dokümanına da yazılır; /api/jobs okumada dönüşüm yapmaz.
+            # Tek batch: aday yoksa (NotFound) ilan dokümanına da yazılmaz.
+            shaped = _frontend_result(result, request.candidate_name)
+            batch = db.batch()
+            batch.update(cand_ref, {"analysis_result": result, "updatedAt": now})
+            batch.update(job_ref, {f"analysisResults.{request.candidate_id}": shaped, "updatedAt": now})
+            await batch.commit()
+            _invalidate_jobs_cache()
 
         return result
     except Exception as e:
@@ -425,5 +1118,107 @@ async def analyze_candidate_endpoint(request: AnalysisRequest):
         raise HTTPException(500, str(e))
 
 
+@app.post("/api/analyze-batch")
+async def analyze_batch_endpoint(request: BatchAnalysisRequest):
+    """Bir iş ilanının birden fazla adayını toplu analiz et ve tek batch ile kaydet"""
+    try:
+        job_ref = db.collection('jobs').document(request.job_id)
+        cand_refs = [job_ref.collection('candidates').document(cid) for cid in request.candidate_ids]
+
+        # İş ilanı + tüm adaylar tek RPC ile
+        snapshots = [snap async for snap in db.get_all([job_ref] + cand_refs)]
+        snap_by_path = {snap.reference.path: snap for snap in snapshots}
+
+        job_snap = snap_by_path.get(job_ref.path)
+        if not job_snap or not job_snap.exists:
+            raise HTTPException(404, "İş ilanı bulunamadı")
+        job_desc = job_snap.to_dict().get("description", "")
+
+        found = []  # [(ref, name, content)]
+        for ref in cand_refs:
+            snap = snap_by_path.get(ref.path)
+            if snap and snap.exists:
+                data = snap.to_dict()
+                found.append((ref, data.get("name", ref.id), data.get("content", "")))
+
+        writes = []
+        response = []
+        shaped = {}
+        for start in range(0, len(found), MAX_BATCH_SIZE):
+            chunk = found[start:start + MAX_BATCH_SIZE]
+            results = await agent.analyze_batch(job_desc, [(name, content) for _, name, content in chunk])
+            for (ref, name, _), result in zip(chunk, results):
+                response.append({"candidate_id": ref.id, **result})
+                if result.get("is_mock"):
+                    continue  # Gemini hatası: sahte skor kaydedilmez
+                writes.append((ref, {"analysis_result": result, "updatedAt": datetime.now().isoformat()}))
+                shaped[ref.id] = _frontend_result(result, name)
+        if shaped:
+            # merge=True iç içe map'i birleştirir; diğer adayların sonuçları korunur
+            writes.append((job_ref, {"analysisResults": shaped, "updatedAt": datetime.now().isoformat()}))
+        if writes:
+            await _commit_batched(writes)
+            _invalidate_jobs_cache()
+
+        return response
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"Toplu Analiz Hatası: {e}")
+        raise HTTPException(500, str(e))
+
+
+@app.post("/api/analyze-job/{job_id}")
+async def analyze_job_endpoint(job_id: str, reanalyze: bool = False):
+    """Bir ilanın tüm adaylarını paralel analiz et (varsayılan: sadece analiz edilmemiş olanlar)"""
+    try:
+        job_ref = db.collection('jobs').document(job_id)
+        job_snap, cand_snaps = await asyncio.gather(
+            job_ref.get(),
+            job_ref.collection('candidates').get(),
+        )
+        if not job_snap.exists:
+            raise HTTPException(404, "İş ilanı bulunamadı")
+        job_desc = job_snap.to_dict().get("description", "")
+
+        pending = [c for c in cand_snaps if reanalyze or not c.to_dict().get('analysis_result')]
+        sem = asyncio.Semaphore(ANALYZE_JOB_CONCURRENCY)
+
+        async def analyze_one(snap):
+            data = snap.to_dict()
+            async with sem:
+                return await agent.analyze(job_desc, data.get("content", ""), data.get("name", snap.id), job_id)
+
+        results = await asyncio.gather(*[analyze_one(c) for c in pending])
+
+        # Gemini hatasında dönen mock sonuçlar kaydedilmez; bu adaylar sonraki çalıştırmada tekrar denenir
+        analyzed = [(c, result) for c, result in zip(pending, results) if not result.get("is_mock")]
+        now = datetime.now().isoformat()
+        writes = [
+            (c.reference, {"analysis_result": result, "updatedAt": now})
+            for c, result in analyzed
+        ]
+        if analyzed:
+            shaped = dict(zip(
+                [c.id for c, _ in analyzed],
+                _frontend_results([result for _, result in analyzed],
+                                  [c.to_dict().get("name", c.id) for c, _ in analyzed])
+            ))
+            writes.append((job_ref, {"analysisResults": shaped, "updatedAt": now}))
+        if writes:
+            await _commit_batched(writes)
+            _invalidate_jobs_cache()
+        return [{"candidate_id": c.id, **result} for c, result in zip(pending, results)]
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"İlan Analiz Hatası: {e}")
+        raise HTTPException(500, str(e))
+
+
 if __name__ == "__main__":
-    uvicorn.run("agent:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Başlatma main.py üzerinden: alter_sys ile __main__ o modül olur, spawn edilen süreçler
+    # bu dosyayı (ve Firebase/Gemini kurulumunu) __mp_main__ olarak yeniden çalıştırmaz
+    import runpy
+
+    runpy.run_module("main", run_name="__main__", alter_sys=True)
@@ -0,0 +1,132 @@
+"""
+CV dosyalarından düz metin çıkarma.
+
+CV ayrıştırma process havuzunda (spawn) çalışır; bu modül import edilirken
+Firebase/Gemini gibi hiçbir client kurulmaz, sadece ayrıştırıcılar yüklenir.
+"""
+import os
+import io
+import time
+import shutil
+import subprocess
+from typing import List, Tuple
+
+# --- PDF/DOCX IMPORT ---
+try:
+    import fitz  # PyMuPDF: C tabanlı, pypdf'ten çok daha hızlı
+except ImportError:
+    fitz = None
+# PyMuPDF yoksa poppler'ın native pdftotext aracı (varsa) pypdf'ten önce denenir
+PDFTOTEXT = shutil.which("pdftotext")
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+try:
+    from docx import Document
+except ImportError:
+    Document = None
+
+# Çok sayfalı (genelde taranmış/grafik ağırlıklı) PDF'ler CV değildir, reddet
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "40"))
+# Tek PDF için metin çıkarma süresi sınırı (sn); aşılırsa kalan sayfalar atlanır
+PDF_PARSE_TIMEOUT = float(os.getenv("PDF_PARSE_TIMEOUT", "5"))
+# CV'den çıkarılacak metin üst sınırı (karakter); aşılınca kalan sayfalar okunmaz
+MAX_EXTRACT_CHARS = int(os.getenv("MAX_EXTRACT_CHARS", "50000"))
+
+
+class CVRejectedError(ValueError):
+    """Boyut/sayfa sınırını aşan CV; endpoint'lerde 413'e çevrilir."""
+
+
+def parse_bytes(file_bytes: bytes, filename: str) -> Tuple[str, bool]:
+    """
+    CV dosyasından düz metin çıkarır (CPU-bound, process havuzunda çalıştırılır).
+    (metin, eksik) döner; eksik=True ise süre sınırı yüzünden kalan sayfalar atlanmıştır.
+    Sayfa sınırı aşılırsa CVRejectedError fırlatır.
+    """
+    timed_out = False
+    if filename.endswith(".pdf"):
+        content, timed_out = _parse_pdf(file_bytes)
+    elif filename.endswith(".docx") and Document:
+        texts, timed_out = _extract_pages(Document(io.BytesIO(file_bytes)).paragraphs, lambda para: para.text)
+        content = "\n".join(texts)
+    elif filename.endswith(".txt"):
+        content = file_bytes.decode("utf-8")
+    else:
+        content = "Metin okunamadı."
+    return content, timed_out
+
+
+def _parse_pdf(file_bytes: bytes) -> Tuple[str, bool]:
+    """PyMuPDF, yoksa pdftotext, o da yoksa/başarısızsa pypdf ile metin çıkarır."""
+    if fitz:
+        doc = fitz.open(stream=file_bytes, filetype="pdf")
+        try:
+            _check_page_count(doc.page_count)
+            texts, timed_out = _extract_pages(doc, lambda page: page.get_text("text"))
+        finally:
+            doc.close()
+        return "\n".join(texts), timed_out
+    if PDFTOTEXT:
+        try:
+            texts, timed_out = _pdftotext(file_bytes)
+            return "\n".join(texts), timed_out
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️ pdftotext başarısız (kod {e.returncode}), pypdf deneniyor")
+    if PdfReader:
+        # Son yedek: native extractor yoksa pypdf kullan
+        reader = PdfReader(io.BytesIO(file_bytes))
+        _check_page_count(len(reader.pages))
+        texts, timed_out = _extract_pages(reader.pages, lambda page: page.extract_text())
+        return "\n".join(texts), timed_out
+    return "Metin okunamadı.", False
+
+
+def _pdftotext(file_bytes: bytes) -> Tuple[List[str], bool]:
+    """
+    Poppler pdftotext ile sayfa metinleri. Sayfa sınırı diğer ayrıştırıcılarla aynı:
+    bir fazla sayfa istenir, fazlası varsa CVRejectedError. Süre aşılırsa o ana kadarki
+    çıktı eksik (True) olarak döner.
+    """
+    try:
+        proc = subprocess.run(
+            [PDFTOTEXT, "-enc", "UTF-8", "-l", str(MAX_PDF_PAGES + 1), "-", "-"],
+            input=file_bytes, capture_output=True, timeout=PDF_PARSE_TIMEOUT, check=True
+        )
+        output, timed_out = proc.stdout, False
+    except subprocess.TimeoutExpired as e:
+        print(f"⚠️ pdftotext {PDF_PARSE_TIMEOUT} sn'yi aştı, kısmi çıktı kullanılıyor")
+        output, timed_out = e.output or b"", True
+    text = output.decode("utf-8", errors="replace")
+    # Sayfalar form feed (\f) ile biter
+    _check_page_count(text.count("\f"))
+    texts, deadline_hit = _extract_pages(text.split("\f"), lambda page: page)
+    return texts, timed_out or deadline_hit
+
+
+def _check_page_count(page_count: int):
+    if page_count > MAX_PDF_PAGES:
+        raise CVRejectedError(f"CV en fazla {MAX_PDF_PAGES} sayfa olabilir ({page_count} sayfa)")
+
+
+def _extract_pages(pages, extract) -> Tuple[List[str], bool]:
+    """
+    Sayfa/paragraf metinlerini toplar, boş olanları eler.
+    Süre sınırı aşılırsa veya MAX_EXTRACT_CHARS toplandıysa kalanları atlar.
+    İkinci değer süre sınırının aşılıp aşılmadığıdır (karakter sınırı her seferinde aynı sonucu verir).
+    """
+    deadline = time.monotonic() + PDF_PARSE_TIMEOUT
+    texts = []
+    total = 0
+    for i, page in enumerate(pages):
+        if time.monotonic() > deadline:
+            print(f"⚠️ Metin çıkarma {PDF_PARSE_TIMEOUT} sn'yi aştı, {i}. bölümden sonrası atlandı")
+            return texts, True
+        text = extract(page)
+        if text:
+            texts.append(text)
+            total += len(text)
+            if total > MAX_EXTRACT_CHARS:
+                break
+    return texts, False
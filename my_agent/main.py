@@ -0,0 +1,26 @@
+"""
+Sunucu başlatıcı: my_agent dizininde `python main.py` (veya `python agent.py`).
+
+Bu modül bilerek yan etkisizdir: spawn ile başlatılan süreçler (uvicorn worker'ları,
+CV ayrıştırma havuzu) ana script'i __mp_main__ olarak yeniden çalıştırır; ana script
+agent.py olsaydı her süreçte Firebase/Gemini client'ları tekrar kurulurdu.
+"""
+import os
+
+import uvicorn
+
+if __name__ == "__main__":
+    # Her worker ayrı process: Firebase/Gemini client'ları process başına bir kez kurulur.
+    # uvloop ve httptools kuruluysa "auto" onları seçer, değilse asyncio/h11'e düşer.
+    # Worker'lar ortamı devralır; CV havuzu boyutu bu sayıya göre hesaplanır
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    os.environ["WEB_CONCURRENCY"] = str(WORKERS)
+    uvicorn.run(
+        "agent:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=WORKERS,
+        reload=False,
+        loop="auto",
+        http="auto"
+    )